@@ -4,17 +4,177 @@ Ramble Mode V2 CLI
 Fast audio transcription using Modal GPU endpoint
 """
 
+import io
 import os
+import json
 import sys
+import glob
 import argparse
+import mimetypes
+import subprocess
+import threading
 import requests
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from requests_toolbelt.multipart.encoder import MultipartEncoder
+except ImportError:  # requests-toolbelt not installed, fall back to in-memory multipart
+    MultipartEncoder = None
+
+# Set once the in-memory upload fallback has been announced
+_FALLBACK_NOTICE_SHOWN = False
 
 # Default endpoint (will be updated after deployment)
 DEFAULT_ENDPOINT = "https://m1ndb0t-2045--api.modal.run"
 
+# Read buffer for streamed uploads (bytes go out as they are read from disk)
+UPLOAD_BUFFER_SIZE = 8 << 20
+
+# Duration bucket boundaries (seconds) used to order batch submissions
+DURATION_BUCKETS = (10, 60)
+
+COMMANDS = ("transcribe", "batch")
+
+# Keep-alive connections per host; batch mode grows this to its concurrency
+POOL_MAXSIZE = 16
+
+# Whisper's input format; VAD runs on (and uploads carry) 16 kHz mono
+SAMPLE_RATE = 16000
+
+# Silero VAD is loaded on first use; None = not loaded yet, False = unavailable.
+# The ONNX model keeps internal state, so batch threads take turns on it.
+_VAD = None
+_VAD_LOCK = threading.Lock()
+
+
+def _make_session(pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+    """Create a pooled keep-alive session so repeated uploads reuse TCP/TLS connections"""
+    session = requests.Session()
+    # Only connection failures are retried: they happen before any of the
+    # body is sent, whereas a streamed upload cannot be replayed once sent.
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.3),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_SESSION = _make_session()
+
+
+def _post_multipart(url: str, fields: dict, timeout: int = 120,
+                    stream: bool = False) -> requests.Response:
+    """POST multipart form fields, streaming file parts when requests-toolbelt is available"""
+    if MultipartEncoder is not None:
+        body = MultipartEncoder(fields)
+        return _SESSION.post(
+            url,
+            data=body,
+            headers={"Content-Type": body.content_type},
+            timeout=timeout,
+            stream=stream,
+        )
+    
+    global _FALLBACK_NOTICE_SHOWN
+    if not _FALLBACK_NOTICE_SHOWN:
+        _FALLBACK_NOTICE_SHOWN = True
+        print("ℹ️  requests-toolbelt not installed, uploads are buffered in memory "
+              "(pip install requests-toolbelt to stream them)")
+    
+    files = {k: v for k, v in fields.items() if isinstance(v, tuple)}
+    data = {k: v for k, v in fields.items() if not isinstance(v, tuple)}
+    return _SESSION.post(url, files=files, data=data, timeout=timeout, stream=stream)
+
+
+def _load_vad():
+    """Load Silero VAD (ONNX, CPU) once; returns (model, get_speech_timestamps) or None"""
+    global _VAD
+    if _VAD is None:
+        try:
+            import torch
+            model, utils = torch.hub.load(
+                "snakers4/silero-vad", "silero_vad", onnx=True, verbose=False
+            )
+            _VAD = (model, utils[0])
+        except Exception as e:
+            print(f"⚠️  VAD unavailable, uploading full audio ({e})")
+            _VAD = False
+    return _VAD or None
+
+
+def strip_silence(audio_path: str) -> bytes:
+    """
+    Decode audio and keep only the voiced regions found by Silero VAD
+    
+    Returns:
+        16 kHz mono s16le PCM bytes, or None if VAD is unavailable,
+        decoding fails or no speech was found
+    """
+    try:
+        result = subprocess.run([
+            "ffmpeg", "-v", "error", "-i", audio_path, "-vn",
+            "-ar", str(SAMPLE_RATE), "-ac", "1", "-f", "s16le", "-"
+        ], capture_output=True, timeout=300)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    pcm = result.stdout
+    
+    with _VAD_LOCK:
+        vad = _load_vad()
+        if vad is None:
+            return None
+        import torch
+        model, get_speech_timestamps = vad
+        wav = torch.frombuffer(bytearray(pcm), dtype=torch.int16).float() / 32768
+        timestamps = get_speech_timestamps(wav, model, sampling_rate=SAMPLE_RATE)
+    
+    if not timestamps:
+        return None
+    # Timestamps are in samples; each s16le sample is 2 bytes
+    return b"".join(pcm[2 * t["start"]:2 * t["end"]] for t in timestamps)
+
 
-def transcribe_file(audio_path: str, endpoint: str = None, language: str = None) -> dict:
+def compress_audio(audio_path: str, pcm: bytes = None) -> bytes:
+    """
+    Transcode audio to 16 kHz mono Opus (what Whisper consumes anyway)
+    
+    Args:
+        audio_path: Path to audio file
+        pcm: 16 kHz mono s16le samples to encode instead of the file (e.g. from strip_silence)
+    
+    Returns:
+        Ogg/Opus bytes, or None if ffmpeg is unavailable or fails
+    """
+    if pcm is not None:
+        source = ["-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "-"]
+    else:
+        source = ["-i", audio_path, "-vn"]
+    
+    try:
+        result = subprocess.run([
+            "ffmpeg", "-v", "error", *source,
+            "-ar", str(SAMPLE_RATE), "-ac", "1", "-c:a", "libopus", "-b:a", "24k",
+            "-f", "ogg", "-"
+        ], input=pcm, capture_output=True, timeout=300)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout
+
+
+def transcribe_file(audio_path: str, endpoint: str = None, language: str = None,
+                    quiet: bool = False, compress: bool = True, stream: bool = False,
+                    vad: bool = False) -> dict:
     """
     Transcribe audio file using Modal GPU endpoint
     
@@ -22,6 +182,10 @@ def transcribe_file(audio_path: str, endpoint: str = None, language: str = None)
         audio_path: Path to audio file
         endpoint: Modal endpoint URL (optional)
         language: Language code (optional, auto-detect if not set)
+        quiet: Suppress progress output (used by batch mode)
+        compress: Transcode to 16 kHz mono Opus before upload
+        stream: Print segments as the server decodes them
+        vad: Strip silence before upload (timestamps then refer to the trimmed audio)
     
     Returns:
         Transcription result dict
@@ -34,22 +198,136 @@ def transcribe_file(audio_path: str, endpoint: str = None, language: str = None)
     
     url = f"{endpoint}/transcribe"
     
-    print(f"🎤 Uploading {audio_path}...")
-    print(f"🌐 Endpoint: {endpoint}")
+    if not quiet:
+        print(f"🎤 Uploading {audio_path}...")
+        print(f"🌐 Endpoint: {endpoint}")
     
-    with open(audio_path, "rb") as f:
-        files = {"file": (os.path.basename(audio_path), f)}
-        data = {}
-        if language:
-            data["language"] = language
-        
+    voiced = strip_silence(audio_path) if compress and vad else None
+    if voiced is not None and not quiet:
+        print(f"🔇 VAD kept {len(voiced) / 2 / SAMPLE_RATE:.1f}s of speech")
+    
+    compressed = compress_audio(audio_path, voiced) if compress else None
+    if compressed is not None:
+        if not quiet:
+            original_size = os.path.getsize(audio_path)
+            print(f"🗜️  Compressed {original_size} → {len(compressed)} bytes (Opus 16 kHz mono)")
+        upload = (Path(audio_path).stem + ".ogg", io.BytesIO(compressed), "audio/ogg")
+        return _upload(url, upload, language, stream)
+    
+    content_type = mimetypes.guess_type(audio_path)[0] or "application/octet-stream"
+    
+    with open(audio_path, "rb", buffering=UPLOAD_BUFFER_SIZE) as f:
+        return _upload(url, (os.path.basename(audio_path), f, content_type), language, stream)
+
+
+def _upload(url: str, upload: tuple, language: str = None, stream: bool = False) -> dict:
+    """POST one (filename, fileobj, content_type) upload and return the JSON result"""
+    fields = {"file": upload}
+    if language:
+        fields["language"] = language
+    if stream:
+        fields["stream"] = "true"
+    
+    try:
+        response = _post_multipart(url, fields, stream=stream)
+        response.raise_for_status()
+        if stream:
+            return _read_stream(response)
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Request failed: {e}")
+        return None
+
+
+def _read_stream(response: requests.Response) -> dict:
+    """Print NDJSON segments as they arrive and assemble the final result dict"""
+    result = {"segments": []}
+    
+    for line in response.iter_lines():
+        if not line:
+            continue
         try:
-            response = requests.post(url, files=files, data=data, timeout=120)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Request failed: {e}")
-            return None
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            # Not NDJSON (e.g. an error page from a proxy)
+            return {"status": "error", "error": f"Unexpected response: {line[:200]!r}"}
+        if "start" in message:
+            print(f"[{message['start']:6.2f}s - {message['end']:6.2f}s] {message['text']}", flush=True)
+            result["segments"].append(message)
+        else:
+            result.update(message)
+    
+    # A stream cut off before the summary line is reported as a failure
+    result.setdefault("text", "")
+    return result
+
+
+def probe_duration(audio_path: str) -> float:
+    """Return audio duration in seconds via ffprobe, or None if unknown"""
+    try:
+        result = subprocess.run([
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", audio_path
+        ], capture_output=True, text=True, timeout=10)
+        return float(result.stdout.strip())
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+
+
+def transcribe_batch(audio_paths: list, endpoint: str = None, language: str = None,
+                     concurrency: int = 8, compress: bool = True, vad: bool = False) -> dict:
+    """
+    Transcribe many audio files concurrently against the endpoint
+    
+    Files are submitted shortest-first, grouped by duration bucket
+    (<10s, 10-60s, >60s), so requests in flight together have similar
+    lengths and the server can batch them with little padding.
+    
+    Args:
+        audio_paths: Paths to audio files
+        endpoint: Modal endpoint URL (optional)
+        language: Language code (optional, auto-detect if not set)
+        concurrency: Maximum number of uploads in flight
+        compress: Transcode to 16 kHz mono Opus before upload
+        vad: Strip silence before upload
+    
+    Returns:
+        Dict mapping each path to its transcription result (None on failure)
+    """
+    global _SESSION
+    if concurrency > POOL_MAXSIZE:
+        # One keep-alive connection per upload in flight, otherwise urllib3
+        # discards the extras after each request
+        _SESSION = _make_session(pool_maxsize=concurrency)
+    
+    results = {}
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        durations = dict(zip(audio_paths, pool.map(probe_duration, audio_paths)))
+        
+        def submit_order(path):
+            duration = durations[path]
+            if duration is None:
+                return (len(DURATION_BUCKETS), 0)
+            bucket = sum(duration >= limit for limit in DURATION_BUCKETS)
+            return (bucket, duration)
+        
+        futures = {
+            pool.submit(
+                transcribe_file, path,
+                endpoint=endpoint, language=language, quiet=True, compress=compress, vad=vad
+            ): path
+            for path in sorted(audio_paths, key=submit_order)
+        }
+        
+        for future in as_completed(futures):
+            path = futures[future]
+            result = future.result()
+            results[path] = result
+            ok = result and result.get("status") == "success"
+            print(f"{'✅' if ok else '❌'} {path}")
+    
+    return results
 
 
 def print_transcription(result: dict, show_segments: bool = False):
@@ -67,6 +345,8 @@ def print_transcription(result: dict, show_segments: bool = False):
     print(f"\n🌍 Language: {result['language']}")
     print(f"⏱️  Duration: {result['duration_seconds']}s")
     print(f"🎯 Model: {result['model']}")
+    if "compute_ms" in result:
+        print(f"⚡ Compute: {result['compute_ms']} ms")
     
     if show_segments and result.get("segments"):
         print(f"\n📊 Segments ({len(result['segments'])}):")
@@ -77,6 +357,87 @@ def print_transcription(result: dict, show_segments: bool = False):
     print("=" * 60)
 
 
+def run_transcribe(args) -> int:
+    """Handle the `transcribe` command"""
+    result = transcribe_file(
+        args.audio_file,
+        endpoint=args.endpoint,
+        language=args.language,
+        compress=not args.no_compress,
+        stream=args.stream,
+        vad=args.vad
+    )
+    
+    if not result:
+        return 1
+    
+    # Streamed segments were already printed as they arrived
+    print_transcription(result, show_segments=args.segments and not args.stream)
+    
+    # Failures still come back as a dict (error payloads, cut-off streams)
+    if result.get("status") != "success":
+        return 1
+    
+    # Save to file if requested
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(result["text"])
+        print(f"\n💾 Saved to: {args.output}")
+    
+    # Also print raw text for piping
+    print(f"\n📋 Raw text (for copying):\n{result['text']}")
+    return 0
+
+
+def run_batch(args) -> int:
+    """Handle the `batch` command"""
+    paths = sorted({p for pattern in args.patterns for p in glob.glob(pattern)})
+    paths = [p for p in paths if os.path.isfile(p)]
+    if not paths:
+        print(f"❌ No files matched: {' '.join(args.patterns)}")
+        return 1
+    
+    print(f"🎤 Transcribing {len(paths)} files ({args.concurrency} concurrent)...")
+    results = transcribe_batch(
+        paths,
+        endpoint=args.endpoint,
+        language=args.language,
+        concurrency=args.concurrency,
+        compress=not args.no_compress,
+        vad=args.vad
+    )
+    
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    
+    failed = 0
+    print("\n" + "=" * 60)
+    for path in paths:
+        result = results.get(path)
+        if not result or result.get("status") != "success":
+            failed += 1
+            continue
+        print(f"\n📝 {path}:\n{result['text']}")
+        if args.output_dir:
+            out_path = os.path.join(args.output_dir, Path(path).stem + ".txt")
+            with open(out_path, "w") as f:
+                f.write(result["text"])
+    print("=" * 60)
+    
+    print(f"\n✅ {len(paths) - failed}/{len(paths)} transcribed")
+    if args.output_dir:
+        print(f"💾 Saved to: {args.output_dir}")
+    return 1 if failed else 0
+
+
+def positive_int(value: str) -> int:
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Ramble Mode V2 - Fast audio transcription",
@@ -94,36 +455,58 @@ Examples:
   
   # Use custom endpoint
   ramble transcribe audio.ogg --endpoint https://your-app.modal.run
+  
+  # Print segments as they are transcribed (long recordings)
+  ramble transcribe podcast.mp3 --stream
+  
+  # Skip silence before upload (needs torch; timestamps refer to the trimmed audio)
+  ramble transcribe meeting.m4a --vad
+  
+  # Transcribe many files in parallel
+  ramble batch "clips/*.ogg" --concurrency 8 --output-dir transcripts/
         """
     )
     
-    parser.add_argument("audio_file", help="Path to audio file")
-    parser.add_argument("--language", "-l", help="Language code (e.g., en, es)")
-    parser.add_argument("--endpoint", "-e", help="Modal endpoint URL")
-    parser.add_argument("--segments", "-s", action="store_true", help="Show segment details")
-    parser.add_argument("--output", "-o", help="Save to file")
+    subparsers = parser.add_subparsers(dest="command")
     
-    args = parser.parse_args()
+    transcribe = subparsers.add_parser("transcribe", help="Transcribe a single audio file")
+    transcribe.add_argument("audio_file", help="Path to audio file")
+    transcribe.add_argument("--language", "-l", help="Language code (e.g., en, es)")
+    transcribe.add_argument("--endpoint", "-e", help="Modal endpoint URL")
+    transcribe.add_argument("--segments", "-s", action="store_true", help="Show segment details")
+    transcribe.add_argument("--output", "-o", help="Save to file")
+    transcribe.add_argument("--no-compress", action="store_true", help="Upload the original file as-is")
+    transcribe.add_argument("--stream", action="store_true", help="Print segments as they are transcribed")
+    transcribe.add_argument("--vad", action="store_true", help="Strip silence before upload (Silero VAD)")
     
-    # Transcribe
-    result = transcribe_file(
-        args.audio_file,
-        endpoint=args.endpoint,
-        language=args.language
-    )
+    batch = subparsers.add_parser("batch", help="Transcribe many audio files concurrently")
+    batch.add_argument("patterns", nargs="+", help="Audio files or glob patterns")
+    batch.add_argument("--language", "-l", help="Language code (e.g., en, es)")
+    batch.add_argument("--endpoint", "-e", help="Modal endpoint URL")
+    batch.add_argument("--concurrency", "-c", type=positive_int, default=8,
+                       help="Uploads in flight (default: 8)")
+    batch.add_argument("--output-dir", "-o", help="Save one .txt per file to this directory")
+    batch.add_argument("--no-compress", action="store_true", help="Upload the original files as-is")
+    batch.add_argument("--vad", action="store_true", help="Strip silence before upload (Silero VAD)")
     
-    if result:
-        print_transcription(result, show_segments=args.segments)
-        
-        # Save to file if requested
-        if args.output:
-            with open(args.output, "w") as f:
-                f.write(result["text"])
-            print(f"\n💾 Saved to: {args.output}")
-        
-        # Also print raw text for piping
-        print(f"\n📋 Raw text (for copying):\n{result['text']}")
+    # Keep `ramble audio.ogg` working as shorthand for `ramble transcribe audio.ogg`
+    # (including the old flags-first form, e.g. `ramble --language en audio.ogg`)
+    argv = sys.argv[1:]
+    if argv and argv[0] not in ("-h", "--help") and not any(arg in COMMANDS for arg in argv):
+        argv = ["transcribe"] + argv
+    
+    args = parser.parse_args(argv)
+    
+    # The voiced audio is only ever uploaded as Opus
+    if getattr(args, "vad", False) and args.no_compress:
+        parser.error("--vad requires compression (drop --no-compress)")
+    
+    if args.command == "batch":
+        sys.exit(run_batch(args))
+    elif args.command == "transcribe":
+        sys.exit(run_transcribe(args))
     else:
+        parser.print_help()
         sys.exit(1)
 
 
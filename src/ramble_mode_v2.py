@@ -1,145 +1,579 @@
 """
 Ramble Mode V2 - Whisper Transcription
-Fast, accurate, multi-speaker audio transcription using OpenAI Whisper
+Fast, accurate, multi-speaker audio transcription using Whisper
+(faster-whisper / CTranslate2, INT8 quantized)
 Deployed on Modal for serverless GPU acceleration
 """
 
+import os
+
 import modal
 from modal import Image, App, asgi_app
 
+# Model configuration - using base model for speed
+MODEL_SIZE = "base"
+
+# Weights are baked into the image here at build time
+MODEL_CACHE = "/root/.cache/whisper"
+
+# Speaker diarization (gated on Hugging Face: enabled when the Modal secret
+# below holds a non-empty HF_TOKEN)
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+HF_SECRET_NAME = "huggingface-secret"
+
+
+def download_models_at_build():
+    """Download model weights into the image so cold starts load from local disk."""
+    from faster_whisper import download_model
+    
+    download_model(MODEL_SIZE, cache_dir=MODEL_CACHE)
+
+
 # Create optimized image with Whisper and dependencies
+# (CTranslate2 needs the CUDA 12 / cuDNN 9 runtime libraries from the base image)
 image = (
-    Image.debian_slim()
-    .apt_install("ffmpeg", "git")
+    Image.from_registry("nvidia/cuda:12.4.1-cudnn-runtime-ubuntu22.04", add_python="3.11")
+    # Exact pins keep the layer hash stable so Modal reuses the cached image
     .pip_install(
-        "fastapi",
-        "python-multipart",
-        "openai-whisper",
-        "torch>=2.0.0",
-        "numpy",
-        "python-docx",
+        "faster-whisper==1.1.1",
+        "pyannote.audio==3.3.2",
+        "torch==2.5.1",
+        "numpy<2",
     )
+    .run_function(download_models_at_build)
+)
+
+# The web container only ingests uploads and decodes audio, so it skips
+# CUDA, torch and the model weights
+web_image = Image.debian_slim(python_version="3.11").pip_install(
+    "fastapi==0.115.6",
+    "python-multipart==0.0.20",
+    "aiofiles==24.1.0",
+    "faster-whisper==1.1.1",
+    "numpy<2",
 )
 
 app = App("ramble-mode-v2")
 
-# Model configuration - using base model for speed
-MODEL_SIZE = "base"
+# Dynamic batching: short clips from concurrent requests share one GPU pass
+SAMPLE_RATE = 16000
+MAX_BATCH = 8            # clips per batch
+MAX_WAIT_MS = 50         # how long the first clip waits for company
+BATCH_MAX_SECONDS = 30   # one Whisper window; longer audio is transcribed alone
+BUCKET_SECONDS = 10      # clips shorter/longer than this are batched separately
 
+# Long audio is split into <=30 s VAD chunks that go through the GPU together
+LONG_AUDIO_BATCH = 16
 
-@app.function(
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Length of the synthetic clip run through the model before serving traffic
+WARMUP_SECONDS = 15
+
+# Mel bins of the language-detection features computed on the CPU side
+# (80 for whisper-base; large-v3 uses 128)
+N_MELS = 80
+
+
+@app.cls(
     image=image,
     gpu="T4",
     memory=8192,
     min_containers=0,
     timeout=300,
+    secrets=[modal.Secret.from_name(HF_SECRET_NAME)],
 )
+@modal.concurrent(max_inputs=MAX_BATCH * 4)
+class Transcriber:
+    """GPU worker: Whisper decode (micro-batched) and speaker diarization."""
+    
+    @modal.enter()
+    def load(self):
+        import ctranslate2
+        import numpy as np
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+        from concurrent.futures import ThreadPoolExecutor
+        
+        # Load model at startup (cached after first call)
+        print(f"🎤 Loading Whisper {MODEL_SIZE} model...")
+        self.device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        self.compute_type = "int8_float16" if self.device == "cuda" else "int8"
+        self.model = WhisperModel(
+            MODEL_SIZE,
+            device=self.device,
+            compute_type=self.compute_type,
+            download_root=MODEL_CACHE,
+            local_files_only=True,
+        )
+        self.batched_model = BatchedInferencePipeline(self.model)
+        print(f"✅ Model loaded on {self.device} ({self.compute_type})!")
+        
+        # A single GPU thread runs Whisper; requests queue up behind it
+        self.gpu_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu")
+        
+        # Diarization runs on the same GPU, in its own thread, alongside Whisper
+        self.diarization_pipeline = None
+        self.diar_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarization")
+        if os.environ.get("HF_TOKEN"):
+            try:
+                import torch
+                from pyannote.audio import Pipeline
+                
+                print(f"🎤 Loading {DIARIZATION_MODEL}...")
+                self.diarization_pipeline = Pipeline.from_pretrained(
+                    DIARIZATION_MODEL, use_auth_token=os.environ["HF_TOKEN"]
+                ).to(torch.device(self.device))
+                print("✅ Diarization loaded!")
+            except Exception as e:
+                print(f"⚠️  Diarization unavailable, using pause-based speakers: {e}")
+        
+        # The batch worker needs the container's event loop, so it starts
+        # with the first request
+        self.batch_queue = None
+        self.batch_worker_task = None
+        
+        # Warm up before accepting traffic so the first request doesn't pay for
+        # CUDA context setup, kernel selection and allocator growth
+        print("🔥 Warming up...")
+        warmup_audio = np.random.default_rng(0).normal(
+            0, 0.01, WARMUP_SECONDS * SAMPLE_RATE
+        ).astype(np.float32)
+        list(self.model.transcribe(warmup_audio, beam_size=5)[0])
+        # Every batched encoder call is (batch, n_mels, 3000): run the largest
+        # batch once so the allocator and GEMM selection are sized for it
+        # (VAD off: the synthetic noise has no speech for it to keep)
+        self.run_batch([(warmup_audio, None, "en", "transcribe", None)] * MAX_BATCH, vad_filter=False)
+        if self.diarization_pipeline is not None:
+            self.diarize(warmup_audio)
+        print("✅ Warm!")
+    
+    def diarize(self, audio):
+        """Run speaker diarization; returns (start, end, label) speaker turns."""
+        import torch
+        
+        waveform = torch.from_numpy(audio).unsqueeze(0)
+        annotation = self.diarization_pipeline({"waveform": waveform, "sample_rate": SAMPLE_RATE})
+        return [
+            (turn.start, turn.end, label)
+            for turn, _, label in annotation.itertracks(yield_label=True)
+        ]
+    
+    def run_single(self, audio, language, task):
+        """Transcribe one long clip, batching its VAD chunks through the GPU."""
+        import time
+        
+        t0 = time.perf_counter_ns()
+        segments, info = self.batched_model.transcribe(
+            audio,
+            language=language,
+            task=task,
+            beam_size=5,
+            vad_filter=True,
+            without_timestamps=False,
+            batch_size=LONG_AUDIO_BATCH,
+        )
+        
+        # Decoding happens lazily while iterating
+        segments = [
+            {"start": seg.start, "end": seg.end, "text": seg.text}
+            for seg in segments
+        ]
+        compute_ms = round((time.perf_counter_ns() - t0) / 1e6, 1)
+        return segments, info.language, compute_ms
+    
+    def run_batch(self, jobs, vad_filter=True):
+        """Transcribe short clips from several requests in shared GPU batches.
+        
+        Each result carries the batch's inference time, since its clips
+        shared the GPU passes.
+        """
+        import time
+        import numpy as np
+        from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+        
+        # Same VAD settings BatchedInferencePipeline uses when it runs VAD itself
+        # (it skips VAD whenever clip_timestamps are given)
+        vad_options = VadOptions(
+            max_speech_duration_s=BATCH_MAX_SECONDS, min_silence_duration_ms=160
+        )
+        
+        t0 = time.perf_counter_ns()
+        languages = []
+        for audio, features, language, _, _ in jobs:
+            if language is None:
+                # Reuse the mel computed on the CPU side when available
+                if features is not None:
+                    language = self.model.detect_language(features=features)[0]
+                else:
+                    language = self.model.detect_language(audio)[0]
+            languages.append(language)
+        
+        # Group by decoder prompt (language/task) and length bucket
+        groups = {}
+        for i, (audio, _, _, task, _) in enumerate(jobs):
+            bucket = len(audio) >= BUCKET_SECONDS * SAMPLE_RATE
+            groups.setdefault((languages[i], task, bucket), []).append(i)
+        
+        results = [None] * len(jobs)
+        for (language, task, _), indices in groups.items():
+            # Lay the clips end to end; each clip's voiced range(s) become batch rows
+            clips = [jobs[i][0] for i in indices]
+            offsets = np.cumsum([0] + [len(clip) for clip in clips])
+            clip_timestamps = []
+            for clip, offset in zip(clips, offsets[:-1].tolist()):
+                if vad_filter:
+                    voiced = merge_segments(get_speech_timestamps(clip, vad_options), vad_options)
+                else:
+                    voiced = [{"start": 0, "end": len(clip)}]
+                clip_timestamps += [
+                    {"start": offset + chunk["start"], "end": offset + chunk["end"]}
+                    for chunk in voiced
+                ]
+            
+            clip_segments = [[] for _ in indices]
+            for k, i in enumerate(indices):
+                results[i] = (clip_segments[k], language)
+            if not clip_timestamps:
+                # No speech in any clip (an empty list would make the pipeline
+                # run VAD over the whole concatenation)
+                continue
+            
+            segments, _ = self.batched_model.transcribe(
+                np.concatenate(clips),
+                language=language,
+                task=task,
+                beam_size=5,
+                without_timestamps=False,
+                batch_size=MAX_BATCH,
+                clip_timestamps=clip_timestamps,
+            )
+            
+            # seek is the start frame of the voiced range (10 ms hops, may round
+            # down by one); map each segment back to its clip and clip-local time
+            clip_frames = offsets[:-1] // (SAMPLE_RATE // 100)
+            for seg in segments:
+                k = int(np.searchsorted(clip_frames, seg.seek + 1, side="right")) - 1
+                offset = int(offsets[k]) / SAMPLE_RATE
+                clip_segments[k].append({
+                    "start": max(seg.start - offset, 0.0),
+                    "end": max(seg.end - offset, 0.0),
+                    "text": seg.text,
+                })
+        
+        compute_ms = round((time.perf_counter_ns() - t0) / 1e6, 1)
+        return [(*result, compute_ms) for result in results]
+    
+    async def batch_worker(self):
+        """Collect queued clips for up to MAX_WAIT_MS and run them as one batch."""
+        import asyncio
+        
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self.batch_queue.get()]
+            deadline = loop.time() + MAX_WAIT_MS / 1000
+            while len(jobs) < MAX_BATCH:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    jobs.append(await asyncio.wait_for(self.batch_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                results = await loop.run_in_executor(self.gpu_pool, self.run_batch, jobs)
+            except Exception as e:
+                for *_, future in jobs:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for (*_, future), result in zip(jobs, results):
+                if not future.done():
+                    future.set_result(result)
+    
+    @modal.method()
+    async def transcribe(self, samples, features, language, task, diarize):
+        """Transcribe int16 16 kHz mono samples.
+        
+        Returns segments, the language, diarization turns (or None) and the
+        Whisper inference time (excluding queueing and diarization).
+        """
+        import asyncio
+        import numpy as np
+        
+        loop = asyncio.get_running_loop()
+        if self.batch_queue is None:
+            # (audio, features, language, task, future) jobs waiting for the batch worker
+            self.batch_queue = asyncio.Queue()
+            # asyncio only keeps weak references to tasks
+            self.batch_worker_task = asyncio.create_task(self.batch_worker())
+        
+        audio = samples.astype(np.float32) / 32768
+        
+        # Start diarization first so it runs concurrently with Whisper
+        diarization = None
+        if diarize and self.diarization_pipeline is not None and len(audio) > 0:
+            diarization = loop.run_in_executor(self.diar_pool, self.diarize, audio)
+        
+        if 0 < len(audio) < BATCH_MAX_SECONDS * SAMPLE_RATE:
+            # Short clip: join the next micro-batch
+            future = loop.create_future()
+            await self.batch_queue.put((audio, features, language, task, future))
+            segments, detected_language, compute_ms = await future
+        else:
+            segments, detected_language, compute_ms = await loop.run_in_executor(
+                self.gpu_pool, self.run_single, audio, language, task
+            )
+        turns = await diarization if diarization is not None else None
+        print(f"⏱️  {compute_ms} ms for {len(audio) / SAMPLE_RATE:.1f}s audio")
+        
+        return {
+            "segments": segments,
+            "language": detected_language,
+            "turns": turns,
+            "compute_ms": compute_ms,
+        }
+    
+    @modal.method()
+    async def stream(self, samples, language, task):
+        """Yield language info, then each segment as it is decoded (bypasses micro-batching)."""
+        import asyncio
+        import numpy as np
+        
+        loop = asyncio.get_running_loop()
+        audio = samples.astype(np.float32) / 32768
+        segments, info = await loop.run_in_executor(
+            self.gpu_pool,
+            lambda: self.model.transcribe(
+                audio, language=language, task=task, beam_size=5, vad_filter=True
+            ),
+        )
+        yield {
+            "language": info.language,
+            "duration_seconds": round(info.duration, 2),
+        }
+        
+        # Segments are decoded lazily; pull them one at a time on the GPU thread
+        while (seg := await loop.run_in_executor(self.gpu_pool, next, segments, None)) is not None:
+            yield {"text": seg.text, "start": round(seg.start, 2), "end": round(seg.end, 2)}
+
+
+@app.function(
+    image=web_image,
+    cpu=2.0,
+    memory=2048,
+    min_containers=0,
+    timeout=300,
+)
+@modal.concurrent(max_inputs=MAX_BATCH * 4)
 @asgi_app(label="api")
 def fastapi_app():
-    """FastAPI app with transcription endpoint."""
-    import whisper
-    import torch
-    import tempfile
-    import subprocess
+    """FastAPI app with transcription endpoint.
+    
+    Runs on a CPU container: uploads are ingested and decoded here, and only
+    the 16 kHz samples are sent to the GPU Transcriber.
+    """
+    import numpy as np
+    from faster_whisper import decode_audio
+    from faster_whisper.feature_extractor import FeatureExtractor
+    import av
+    import asyncio
+    import json
+    import aiofiles
+    import aiofiles.tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import time
     import os
     from fastapi import FastAPI, File, UploadFile, Form
-    from fastapi.responses import JSONResponse
+    from fastapi.responses import JSONResponse, StreamingResponse
     from typing import Optional
     
     web_app = FastAPI(title="Ramble Mode V2", version="2.0.0")
     
-    # Load model at startup (cached after first call)
-    print(f"🎤 Loading Whisper {MODEL_SIZE} model...")
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = whisper.load_model(MODEL_SIZE).to(device)
-    print(f"✅ Model loaded on {device}!")
+    transcriber = Transcriber()
+    feature_extractor = FeatureExtractor(feature_size=N_MELS)
+    
+    # Decoding and mel computation run in threads so the event loop keeps
+    # serving uploads and health checks
+    cpu_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cpu")
+    
+    def preprocess(path, detect_language):
+        """Decode to 16 kHz mono int16, plus the first-window mel for language detection."""
+        audio = decode_audio(path, sampling_rate=SAMPLE_RATE)
+        features = None
+        if detect_language and 0 < len(audio) < BATCH_MAX_SECONDS * SAMPLE_RATE:
+            features = feature_extractor(audio)
+        # decode_audio scales s16 samples to float32, so this round trip is
+        # exact and halves what goes over the wire
+        samples = np.round(audio * 32768).clip(-32768, 32767).astype(np.int16)
+        return samples, features
+    
+    def format_segments(segments, speaker_detection, turns=None):
+        """Round timestamps and attach speaker labels in one vectorized pass.
+        
+        Speakers come from diarization turns when given, otherwise from pauses.
+        """
+        n = len(segments)
+        if n == 0:
+            return [], 0 if speaker_detection else 1
+        
+        starts = np.fromiter((seg["start"] for seg in segments), np.float64, n)
+        ends = np.fromiter((seg["end"] for seg in segments), np.float64, n)
+        
+        if speaker_detection and turns:
+            # Each segment takes the speaker whose turns overlap it the most
+            # (or the nearest turn if none overlap)
+            turn_starts = np.array([turn[0] for turn in turns])
+            turn_ends = np.array([turn[1] for turn in turns])
+            _, turn_speakers = np.unique([turn[2] for turn in turns], return_inverse=True)
+            
+            overlap = np.clip(
+                np.minimum(ends[:, None], turn_ends) - np.maximum(starts[:, None], turn_starts),
+                0, None,
+            )
+            speaker_overlap = overlap @ np.eye(turn_speakers.max() + 1)[turn_speakers]
+            best = speaker_overlap.argmax(axis=1)
+            
+            unmatched = speaker_overlap.max(axis=1) <= 0
+            if unmatched.any():
+                mids = (starts[unmatched] + ends[unmatched]) / 2
+                nearest = np.abs(mids[:, None] - (turn_starts + turn_ends) / 2).argmin(axis=1)
+                best[unmatched] = turn_speakers[nearest]
+            
+            # Number speakers 1, 2, ... in order of first appearance
+            numbering = {}
+            for speaker in best.tolist():
+                numbering.setdefault(speaker, len(numbering) + 1)
+            speaker_ids = np.array([numbering[speaker] for speaker in best.tolist()])
+            speakers_detected = len(numbering)
+        elif speaker_detection:
+            # Simple speaker detection (based on pauses): a gap > 2 seconds
+            # before segment i starts a new speaker, "Speaker {(i % 2) + 1}",
+            # who keeps talking until the next such gap
+            gaps = starts - np.concatenate(([0.0], ends[:-1]))
+            switches = np.where(gaps > 2.0, np.arange(n), -1)
+            last_switch = np.maximum.accumulate(switches)
+            speaker_ids = np.where(last_switch >= 0, last_switch % 2 + 1, 1)
+            speakers_detected = len(np.unique(speaker_ids))
+        else:
+            speaker_ids = np.ones(n, dtype=np.int64)
+            speakers_detected = 1
+        
+        formatted_segments = [
+            {"speaker": f"Speaker {speaker}", "text": seg["text"].strip(), "start": start, "end": end}
+            for seg, speaker, start, end in zip(
+                segments,
+                speaker_ids.tolist(),
+                np.round(starts, 2).tolist(),
+                np.round(ends, 2).tolist(),
+            )
+        ]
+        return formatted_segments, speakers_detected
+    
+    async def stream_segments(samples, language, task):
+        """Yield NDJSON lines: language info, each segment as it is decoded, then a summary."""
+        t0 = time.perf_counter_ns()
+        try:
+            texts = []
+            async for message in transcriber.stream.remote_gen.aio(samples, language, task):
+                if "start" in message:
+                    texts.append(message["text"])
+                    message["text"] = message["text"].strip()
+                yield json.dumps(message) + "\n"
+            
+            yield json.dumps({
+                "text": "".join(texts).strip(),
+                "status": "success",
+                "model": f"whisper-{MODEL_SIZE}",
+                "task": task,
+                "compute_ms": round((time.perf_counter_ns() - t0) / 1e6, 1),
+            }) + "\n"
+        
+        except Exception as e:
+            yield json.dumps({"text": "", "status": "error", "error": str(e)}) + "\n"
     
     @web_app.post("/transcribe")
     async def transcribe(
         file: UploadFile = File(...),
         language: Optional[str] = Form(None),
         task: str = Form("transcribe"),
-        speaker_detection: bool = Form(True)
+        speaker_detection: str = Form("true"),
+        stream: bool = Form(False)
     ):
-        """Transcribe uploaded audio file."""
+        """Transcribe uploaded audio file.
         
-        # Read uploaded file
-        audio_bytes = await file.read()
-        
-        # Save to temp file
-        suffix = os.path.splitext(file.filename)[1] or ".ogg"
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
-            f.write(audio_bytes)
-            temp_path = f.name
+        speaker_detection: "true" (diarization when available, else pauses),
+        "fast" (pause heuristic only) or "false".
+        """
+        speaker_detection = speaker_detection.lower()
+        detect_speakers = speaker_detection not in ("false", "0", "off", "no")
+        use_diarization = detect_speakers and speaker_detection != "fast"
         
+        temp_path = None
         try:
-            # Convert to WAV (Whisper prefers this)
-            wav_path = temp_path.replace(suffix, "_processed.wav")
-            result = subprocess.run([
-                "ffmpeg", "-i", temp_path, "-ar", "16000", "-ac", "1",
-                "-f", "wav", "-y", wav_path
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode != 0:
+            # Stream the upload to a temp file in chunks (memory stays O(chunk))
+            suffix = os.path.splitext(file.filename)[1] or ".ogg"
+            async with aiofiles.tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False) as f:
+                temp_path = f.name
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
+            
+            # Decode and resample to 16 kHz mono in-process (PyAV),
+            # no ffmpeg subprocess or intermediate WAV file
+            # Blocking work runs in worker threads so the event loop keeps
+            # serving uploads and health checks while the GPU is busy
+            loop = asyncio.get_running_loop()
+            try:
+                samples, features = await loop.run_in_executor(
+                    cpu_pool, preprocess, temp_path, language is None and not stream
+                )
+            except av.error.FFmpegError as e:
                 return JSONResponse({
                     "text": "",
                     "status": "error",
-                    "error": f"Audio conversion failed: {result.stderr}"
+                    "error": f"Audio conversion failed: {e}"
                 }, status_code=400)
             
-            # Transcribe with Whisper
-            print(f"🎯 Transcribing {len(audio_bytes)} bytes on {device}...")
+            # Transcribe with Whisper on the GPU worker
+            print(f"🎯 Transcribing {os.path.getsize(temp_path)} bytes...")
             
-            options = {
-                "task": task,
-                "fp16": torch.cuda.is_available(),
-            }
-            if language:
-                options["language"] = language
+            if stream:
+                # Send segments as they are decoded (bypasses micro-batching)
+                return StreamingResponse(
+                    stream_segments(samples, language, task),
+                    media_type="application/x-ndjson",
+                )
             
-            result = model.transcribe(wav_path, **options)
+            result = await transcriber.transcribe.remote.aio(
+                samples, features, language, task, use_diarization
+            )
+            segments = result["segments"]
+            turns = result["turns"]
             
             # Format response
-            segments = result.get("segments", [])
-            full_text = result.get("text", "").strip()
-            detected_language = result.get("language", "unknown")
-            
-            # Simple speaker detection (based on pauses)
-            formatted_segments = []
-            current_speaker = "Speaker 1"
-            last_end = 0
-            
-            for i, seg in enumerate(segments):
-                # If gap > 2 seconds, assume new speaker
-                if seg["start"] - last_end > 2.0 and speaker_detection:
-                    current_speaker = f"Speaker {(i % 2) + 1}"
-                
-                formatted_segments.append({
-                    "speaker": current_speaker,
-                    "text": seg["text"].strip(),
-                    "start": round(seg["start"], 2),
-                    "end": round(seg["end"], 2),
-                })
-                last_end = seg["end"]
+            full_text = "".join(seg["text"] for seg in segments).strip()
+            
+            formatted_segments, speakers_detected = format_segments(
+                segments, detect_speakers, turns
+            )
             
             return {
                 "text": full_text,
-                "language": detected_language,
+                "language": result["language"],
                 "duration_seconds": round(segments[-1]["end"], 2) if segments else 0,
                 "segments": formatted_segments,
                 "status": "success",
                 "model": f"whisper-{MODEL_SIZE}",
                 "task": task,
-                "speakers_detected": len(set(s["speaker"] for s in formatted_segments)) if speaker_detection else 1
+                "compute_ms": result["compute_ms"],
+                "speakers_detected": speakers_detected,
+                "speaker_method": (
+                    "diarization" if turns else "pauses" if detect_speakers else "none"
+                ),
             }
             
-        except subprocess.TimeoutExpired:
-            return JSONResponse({
-                "text": "",
-                "status": "error",
-                "error": "Audio processing timed out (file too large?)"
-            }, status_code=408)
-            
         except Exception as e:
             import traceback
             return JSONResponse({
@@ -150,18 +584,20 @@ def fastapi_app():
             }, status_code=500)
         
         finally:
-            # Cleanup temp files
-            for path in [temp_path, wav_path]:
-                if os.path.exists(path):
-                    os.unlink(path)
+            # Cleanup temp file
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
     
     @web_app.post("/translate")
     async def translate(
         file: UploadFile = File(...),
-        source_language: Optional[str] = Form(None)
+        source_language: Optional[str] = Form(None),
+        stream: bool = Form(False)
     ):
         """Translate audio to English text."""
-        return await transcribe(file, language=source_language, task="translate", speaker_detection=False)
+        return await transcribe(
+            file, language=source_language, task="translate", speaker_detection="false", stream=stream
+        )
     
     @web_app.get("/")
     async def root():
@@ -170,13 +606,13 @@ def fastapi_app():
             "version": "2.0.0",
             "model": f"whisper-{MODEL_SIZE}",
             "endpoints": {
-                "/transcribe": "POST - Transcribe audio file",
+                "/transcribe": "POST - Transcribe audio file (stream=true for NDJSON segments)",
                 "/translate": "POST - Translate to English",
                 "/health": "GET - Health check"
             },
             "features": [
                 "Multi-language support",
-                "Speaker detection",
+                "Speaker diarization (pyannote, pause-based fallback)",
                 "Translation to English",
                 "Segment-level timestamps"
             ],
@@ -188,8 +624,7 @@ def fastapi_app():
         return {
             "status": "healthy",
             "model": f"whisper-{MODEL_SIZE}",
-            "device": device,
-            "gpu_available": torch.cuda.is_available()
+            "gpu": "T4"
         }
     
     return web_app
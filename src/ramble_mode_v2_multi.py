@@ -1,29 +1,16 @@
 """
-Ramble Mode V2 - Multi-Model with Volume
-Pre-download all Whisper models to Modal Volume for instant access
+Ramble Mode V2 - Multi-Model
+All Whisper models are baked into the image for instant access
+(a Modal Volume is kept as a fallback cache)
+Runs faster-whisper (CTranslate2) with INT8 quantization
 """
 
 import modal
 from modal import Image, App, asgi_app, Volume
 
-# Create volume for model caching
+# Create volume for model caching (fallback if a model is missing from the image)
 model_volume = Volume.from_name("whisper-models", create_if_missing=True)
 
-# Create optimized image
-image = (
-    Image.debian_slim()
-    .apt_install("ffmpeg", "git")
-    .pip_install(
-        "fastapi",
-        "python-multipart",
-        "openai-whisper",
-        "torch>=2.0.0",
-        "numpy",
-    )
-)
-
-app = App("ramble-mode-v2-multi")
-
 # Available models
 MODELS = {
     "tiny": {"size": "tiny", "speed": "fastest", "accuracy": "basic", "vram": "1GB"},
@@ -35,6 +22,47 @@ MODELS = {
 
 DEFAULT_MODEL = "base"
 
+# Models stay resident until their combined VRAM (per MODELS) would exceed this
+VRAM_BUDGET_GB = 12
+
+# Audio is split into <=30 s VAD chunks that go through the GPU together
+BATCH_SIZE = 16
+
+# Weights are baked into the image here at build time
+MODEL_CACHE = "/root/.cache/whisper"
+
+
+def download_models_at_build():
+    """Download all model weights into the image so cold starts load from local disk"""
+    from faster_whisper import download_model
+    
+    for model_name in MODELS.keys():
+        download_model(model_name, cache_dir=MODEL_CACHE)
+
+
+# Create optimized image
+# (CTranslate2 needs the CUDA 12 / cuDNN 9 runtime libraries from the base image)
+image = (
+    Image.from_registry("nvidia/cuda:12.4.1-cudnn-runtime-ubuntu22.04", add_python="3.11")
+    # Exact pins keep the layer hash stable so Modal reuses the cached image
+    .pip_install(
+        "fastapi==0.115.6",
+        "python-multipart==0.0.20",
+        "aiofiles==24.1.0",
+        "faster-whisper==1.1.1",
+        "numpy<2",
+    )
+    .run_function(download_models_at_build)
+)
+
+app = App("ramble-mode-v2-multi")
+
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Length of the synthetic clip run through the default model at startup
+WARMUP_SECONDS = 15
+
 
 @app.function(
     image=image,
@@ -45,18 +73,17 @@ DEFAULT_MODEL = "base"
 )
 def download_models():
     """Pre-download all Whisper models to volume"""
-    import whisper
-    import os
+    from faster_whisper import download_model
     
     print("📥 Downloading Whisper models to volume...")
     
     for model_name in MODELS.keys():
-        model_path = f"/models/whisper-{model_name}.pt"
-        if os.path.exists(model_path):
+        try:
+            download_model(model_name, cache_dir="/models", local_files_only=True)
             print(f"✅ {model_name}: Already cached")
-        else:
+        except Exception:
             print(f"📥 {model_name}: Downloading...")
-            model = whisper.load_model(model_name, download_root="/models")
+            download_model(model_name, cache_dir="/models")
             print(f"✅ {model_name}: Downloaded ({MODELS[model_name]['vram']})")
     
     print("\n🎉 All models ready!")
@@ -74,42 +101,133 @@ def download_models():
 @asgi_app(label="api")
 def fastapi_app():
     """FastAPI app with multi-model support"""
-    import whisper
-    import torch
-    import tempfile
-    import subprocess
+    import ctranslate2
+    import numpy as np
+    from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
+    import asyncio
+    import gc
+    import aiofiles
+    import aiofiles.tempfile
+    import threading
+    import time
     import os
+    from collections import OrderedDict
+    from concurrent.futures import Future
     from fastapi import FastAPI, File, UploadFile, Form
     from fastapi.responses import JSONResponse
     from typing import Optional
     
     web_app = FastAPI(title="Ramble Mode V2 - Multi", version="2.1.0")
     
-    # Cache for loaded models
-    loaded_models = {}
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    # LRU cache of loaded models (least recently used first). Requests run in
+    # threads: the lock guards the cache, but loads run outside it (one
+    # Future per model being loaded) so a cold load doesn't block requests
+    # for models that are already resident
+    loaded_models = OrderedDict()
+    loading_models = {}
+    loaded_models_lock = threading.Lock()
+    device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    compute_type = "int8_float16" if device == "cuda" else "int8"
+    
+    def vram_gb(model_size: str) -> int:
+        """VRAM footprint in GB as listed in MODELS"""
+        return int(MODELS[model_size]["vram"].rstrip("GB"))
     
     def get_model(model_size: str):
-        """Load model from volume or download"""
-        if model_size not in loaded_models:
-            print(f"🎤 Loading whisper-{model_size}...")
-            model_path = f"/models/whisper-{model_size}.pt"
-            
-            if os.path.exists(model_path):
-                # Load from cached volume
-                loaded_models[model_size] = whisper.load_model(
-                    model_size, 
-                    download_root="/models"
-                ).to(device)
-            else:
-                # Download if not cached
-                loaded_models[model_size] = whisper.load_model(
-                    model_size
-                ).to(device)
+        """Get a model from the LRU cache, loading (and evicting) as needed"""
+        with loaded_models_lock:
+            if model_size in loaded_models:
+                loaded_models.move_to_end(model_size)
+                return loaded_models[model_size]
             
-            print(f"✅ Loaded on {device}")
+            pending = loading_models.get(model_size)
+            is_loader = pending is None
+            if is_loader:
+                pending = loading_models[model_size] = Future()
+                
+                # Evict least recently used models until the new one fits
+                # (models still loading count against the budget too)
+                used = sum(vram_gb(m) for m in [*loaded_models, *loading_models])
+                evicted_any = False
+                while loaded_models and used > VRAM_BUDGET_GB:
+                    # Drop the model without keeping a reference, so the
+                    # collect below frees its VRAM before the next load
+                    evicted = next(iter(loaded_models))
+                    del loaded_models[evicted]
+                    used -= vram_gb(evicted)
+                    evicted_any = True
+                    print(f"♻️  Evicted whisper-{evicted}")
+        
+        if not is_loader:
+            # Another request is already loading this model
+            return pending.result()
+        
+        if evicted_any:
+            gc.collect()
+        
+        try:
+            model = load_model(model_size)
+        except Exception as e:
+            with loaded_models_lock:
+                del loading_models[model_size]
+            pending.set_exception(e)
+            raise
+        
+        with loaded_models_lock:
+            loaded_models[model_size] = model
+            del loading_models[model_size]
+        pending.set_result(model)
+        return model
+    
+    def load_model(model_size: str):
+        """Load model from the image, falling back to the volume (downloads if not cached)"""
+        print(f"🎤 Loading whisper-{model_size}...")
+        try:
+            model = WhisperModel(
+                model_size,
+                device=device,
+                compute_type=compute_type,
+                download_root=MODEL_CACHE,
+                local_files_only=True,
+            )
+        except Exception:
+            model = WhisperModel(
+                model_size,
+                device=device,
+                compute_type=compute_type,
+                download_root="/models",
+            )
+        print(f"✅ Loaded on {device} ({compute_type})")
+        return model
+    
+    # Load and warm up the default model before accepting traffic so the
+    # first request doesn't pay for CUDA context setup and kernel selection
+    print("🔥 Warming up...")
+    warmup_audio = np.random.default_rng(0).normal(
+        0, 0.01, WARMUP_SECONDS * 16000
+    ).astype(np.float32)
+    list(get_model(DEFAULT_MODEL).transcribe(warmup_audio, beam_size=5)[0])
+    print("✅ Warm!")
+    
+    def run_transcription(audio, model_size, language, task):
+        """Load the model if needed and transcribe (blocking, run in a thread)
         
-        return loaded_models[model_size]
+        Returns segments, info and the inference time in ms (model loading excluded)
+        """
+        pipeline = BatchedInferencePipeline(get_model(model_size))
+        t0 = time.perf_counter_ns()
+        segments, info = pipeline.transcribe(
+            audio,
+            language=language,
+            task=task,
+            beam_size=5,
+            vad_filter=True,
+            batch_size=BATCH_SIZE,
+        )
+        # Decoding happens lazily while iterating
+        segments = list(segments)
+        compute_ms = round((time.perf_counter_ns() - t0) / 1e6, 1)
+        return segments, info, compute_ms
     
     @web_app.post("/transcribe")
     async def transcribe(
@@ -126,42 +244,33 @@ def fastapi_app():
                 "error": f"Invalid model. Choose from: {list(MODELS.keys())}"
             }, status_code=400)
         
-        # Read uploaded file
-        audio_bytes = await file.read()
-        suffix = os.path.splitext(file.filename)[1] or ".ogg"
-        
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
-            f.write(audio_bytes)
-            temp_path = f.name
-        
+        temp_path = None
         try:
-            # Convert to WAV
-            wav_path = temp_path.replace(suffix, "_processed.wav")
-            subprocess.run([
-                "ffmpeg", "-i", temp_path, "-ar", "16000", "-ac", "1",
-                "-f", "wav", "-y", wav_path
-            ], capture_output=True, timeout=30)
+            # Stream the upload to a temp file in chunks (memory stays O(chunk))
+            suffix = os.path.splitext(file.filename)[1] or ".ogg"
+            async with aiofiles.tempfile.NamedTemporaryFile("wb", suffix=suffix, delete=False) as f:
+                temp_path = f.name
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    await f.write(chunk)
             
-            # Load model and transcribe
-            model_obj = get_model(model)
-            
-            options = {
-                "task": task,
-                "fp16": torch.cuda.is_available(),
-            }
-            if language:
-                options["language"] = language
+            # Decode and resample to 16 kHz mono in-process (PyAV); blocking
+            # work runs in threads so the event loop keeps serving requests
+            audio = await asyncio.to_thread(decode_audio, temp_path, sampling_rate=16000)
             
-            start_time = os.time() if hasattr(os, 'time') else 0
-            result = model_obj.transcribe(wav_path, **options)
+            # Load model and transcribe
+            segments, info, compute_ms = await asyncio.to_thread(
+                run_transcription, audio, model, language, task
+            )
+            print(f"⏱️  whisper-{model}: {compute_ms} ms for {info.duration:.1f}s audio")
             
             # Format response
             return {
-                "text": result.get("text", "").strip(),
-                "language": result.get("language", "unknown"),
-                "duration_seconds": round(result["segments"][-1]["end"], 2) if result.get("segments") else 0,
+                "text": "".join(seg.text for seg in segments).strip(),
+                "language": info.language,
+                "duration_seconds": round(segments[-1].end, 2) if segments else 0,
                 "model": f"whisper-{model}",
                 "model_info": MODELS[model],
+                "compute_ms": compute_ms,
                 "status": "success",
             }
             
@@ -172,9 +281,8 @@ def fastapi_app():
             }, status_code=500)
         
         finally:
-            for path in [temp_path, wav_path]:
-                if os.path.exists(path):
-                    os.unlink(path)
+            if temp_path and os.path.exists(temp_path):
+                os.unlink(temp_path)
     
     @web_app.get("/models")
     async def list_models():
@@ -182,7 +290,8 @@ def fastapi_app():
         return {
             "models": MODELS,
             "default": DEFAULT_MODEL,
-            "current_device": device
+            "current_device": device,
+            "compute_type": compute_type
         }
     
     @web_app.get("/")
@@ -203,7 +312,7 @@ def fastapi_app():
 @app.local_entrypoint()
 def main():
     print("🎤 Ramble Mode V2 - Multi-Model")
-    print("\nFirst run:")
-    print("  modal run ramble_mode_v2_multi.py::download_models")
-    print("\nThen deploy:")
+    print("\nDeploy (models are baked into the image):")
     print("  modal deploy ramble_mode_v2_multi.py")
+    print("\nOptional - fill the fallback volume:")
+    print("  modal run ramble_mode_v2_multi.py::download_models")